@@ -3,19 +3,112 @@ import sys
 import venv
 from pathlib import Path
 import ast
+import hashlib
+import pickle
 import shutil
 import re
 import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
 from google.api_core.exceptions import ResourceExhausted, NotFound
 from pypi_simple import PyPISimple
 from packaging.version import parse as parse_version
 from agent_utils import start_group, end_group, run_command, validate_changes
 
+_PKG_NAME_RE = re.compile(r'([a-zA-Z0-9\-_]+)')
+_PINNED_RE = re.compile(r'^[a-zA-Z0-9\-_\[\]\.]+==.+$')
+_CONFLICT_RE = re.compile(r"Cannot install(?P<packages>[\s\S]+?)because")
+_JSON_RE = re.compile(r'\{.*\}', re.DOTALL)
+_LIST_RE = re.compile(r'(\[.*?\])', re.DOTALL)
+
+
+def _read_req_lines(path):
+    """Reads a requirements-style file in one pass, returning the stripped,
+    non-comment lines."""
+    return [s for s in (l.strip() for l in Path(path).read_text().splitlines())
+            if s and not s.startswith('#')]
+
+
+@lru_cache(maxsize=4096)
+def _pkg_name(spec_line):
+    """Extracts the package name from a requirement spec line. Pure, so the
+    result is memoized — the same lines come back for every pass and probe."""
+    match = _PKG_NAME_RE.match(spec_line)
+    return match.group(1) if match else None
+
+class _ImportVisitor(ast.NodeVisitor):
+    """Collects imported top-level module names without descending into
+    function or class bodies (module-top imports are what matter for risk)."""
+
+    def __init__(self):
+        self.modules = []
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.modules.append(alias.name.split('.')[0])
+
+    def visit_ImportFrom(self, node):
+        if node.module:
+            self.modules.append(node.module.split('.')[0])
+
+    def _skip(self, node):
+        pass
+
+    visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = _skip
+
+
+def _extract_imports(path_str):
+    """Parses one Python file (through the on-disk AST cache) and returns a
+    mapping of imported top-level module names to occurrence counts.
+    Module-level so ProcessPoolExecutor workers can pickle it."""
+    counts = {}
+    try:
+        with open(path_str, 'rb') as f:
+            content = f.read()
+        if b'import ' not in content and b'from ' not in content:
+            return counts
+        cache_dir = Path('.agent_cache/ast')
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        py_tag = f"py{sys.version_info.major}{sys.version_info.minor}"
+        cache_path = cache_dir / f"{hashlib.sha256(content).hexdigest()[:16]}-{py_tag}.pkl"
+        tree = None
+        if cache_path.exists():
+            try:
+                with open(cache_path, 'rb') as f:
+                    tree = pickle.load(f)
+            except Exception:
+                # A torn/corrupt entry must not poison the cache forever:
+                # fall through to a fresh parse and rewrite it.
+                tree = None
+        if tree is None:
+            tree = ast.parse(content, filename=path_str)
+            # Write-then-rename so concurrent pool workers never observe a
+            # half-written pickle; the pid suffix keeps their temp files apart.
+            tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(tree, f)
+            os.replace(tmp_path, cache_path)
+        visitor = _ImportVisitor()
+        visitor.visit(tree)
+        for root_module in visitor.modules:
+            counts[root_module] = counts.get(root_module, 0) + 1
+    except Exception:
+        pass
+    return counts
+
+
 class DependencyAgent:
     def __init__(self, config, llm_client):
         self.config = config
         self.llm = llm_client
         self.pypi = PyPISimple()
+        self._page_cache = {}
+        self._probe_baseline = None
+        self._probe_overrides = {}
+        self._probe_cache = {}
+        self._summary_cache = {}
+        os.environ.setdefault("PIP_NO_INPUT", "1")
+        os.environ.setdefault("PIP_DISABLE_PIP_VERSION_CHECK", "1")
         self.requirements_path = Path(config["REQUIREMENTS_FILE"])
         self.primary_packages = self._load_primary_packages()
         self.llm_available = True
@@ -31,54 +124,70 @@ class DependencyAgent:
         else:
             repo_dir = Path('.')
 
-        for py_file in repo_dir.rglob('*.py'):
-            if any(part in str(py_file) for part in ['temp_venv', 'final_venv', 'bootstrap_venv']):
+        # os.walk with in-place pruning skips excluded trees entirely, unlike
+        # rglob which visits them and filters afterwards.
+        skip_dirs = {'temp_venv', 'final_venv', 'bootstrap_venv', 'probe_venv',
+                     '__pycache__', '.git', '.venv', 'node_modules'}
+        py_paths = []
+        for root, dirs, files in os.walk(repo_dir):
+            dirs[:] = [d for d in dirs if d not in skip_dirs]
+            py_paths.extend(os.path.join(root, f) for f in files if f.endswith('.py'))
+
+        # Source rarely changes between agent runs; skip the whole scan when the
+        # tree fingerprint (paths + mtimes + sizes) matches the persisted scores.
+        fingerprint = hashlib.sha256()
+        for path in sorted(py_paths):
+            try:
+                st = os.stat(path)
+            except OSError:
                 continue
+            fingerprint.update(f"{path}:{st.st_mtime_ns}:{st.st_size}".encode())
+        fingerprint = fingerprint.hexdigest()
+
+        scores_cache_path = Path('.agent_cache/usage_scores.json')
+        if scores_cache_path.exists():
             try:
-                with open(py_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    tree = ast.parse(content)
-                    for node in ast.walk(tree):
-                        if isinstance(node, ast.Import):
-                            for alias in node.names:
-                                module_name = self._get_package_name_from_spec(alias.name.split('.')[0])
-                                scores[module_name] = scores.get(module_name, 0) + 1
-                        elif isinstance(node, ast.ImportFrom) and node.module:
-                            module_name = self._get_package_name_from_spec(node.module.split('.')[0])
-                            scores[module_name] = scores.get(module_name, 0) + 1
+                cached = json.loads(scores_cache_path.read_text())
+                if cached.get('fingerprint') == fingerprint:
+                    print("Usage scores loaded from cache (source tree unchanged).")
+                    end_group()
+                    return cached['scores']
             except Exception:
-                continue
-        
+                pass
+
+        with ProcessPoolExecutor() as executor:
+            for file_counts in executor.map(_extract_imports, py_paths, chunksize=32):
+                for root_module, count in file_counts.items():
+                    module_name = self._get_package_name_from_spec(root_module)
+                    scores[module_name] = scores.get(module_name, 0) + count
+
         normalized_scores = {name.replace('_', '-'): score for name, score in scores.items()}
+        scores_cache_path.parent.mkdir(parents=True, exist_ok=True)
+        scores_cache_path.write_text(json.dumps({'fingerprint': fingerprint, 'scores': normalized_scores}))
         print("Usage scores calculated.")
         end_group()
         return normalized_scores
 
     def _get_package_name_from_spec(self, spec_line):
-        match = re.match(r'([a-zA-Z0-9\-_]+)', spec_line)
-        return match.group(1) if match else None
+        return _pkg_name(spec_line)
 
     def _load_primary_packages(self):
         primary_path = Path(self.config["PRIMARY_REQUIREMENTS_FILE"])
         if not primary_path.exists(): return set()
-        with open(primary_path, "r") as f:
-            return {self._get_package_name_from_spec(line.strip()) for line in f if line.strip() and not line.startswith('#')}
+        return {self._get_package_name_from_spec(line) for line in _read_req_lines(primary_path)}
 
     def _get_requirements_state(self):
         if not self.requirements_path.exists():
             sys.exit(f"CRITICAL ERROR: Requirements file not found at {self.requirements_path}")
 
-        with open(self.requirements_path, "r") as f:
-            lines = [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
-        
+        lines = _read_req_lines(self.requirements_path)
+
         if not lines:
             return True, []
 
-        pinned_pattern = re.compile(r'^[a-zA-Z0-9\-_\[\]\.]+==.+$')
-
         def is_unpinned(line):
             if line.startswith('-e'): return False
-            if pinned_pattern.match(line): return False
+            if _PINNED_RE.match(line): return False
             return True
 
         is_fully_pinned = not any(is_unpinned(line) for line in lines)
@@ -93,7 +202,7 @@ class DependencyAgent:
         python_executable = str((venv_dir / "bin" / "python").resolve())
         
         print(f"\n--- Step 1: Installing from requirements file: {self.requirements_path} ---")
-        _, stderr, returncode = run_command([python_executable, "-m", "pip", "install", "-r", str(self.requirements_path)])
+        _, stderr, returncode = run_command([python_executable, "-m", "pip", "install", "--prefer-binary", "-r", str(self.requirements_path)])
         
         if returncode != 0:
             print(f"CRITICAL ERROR: Failed to install initial dependencies. Log follows:\n{stderr}")
@@ -142,13 +251,23 @@ class DependencyAgent:
             shutil.copy(self.requirements_path, pass_baseline_reqs_path)
             
             packages_to_update = []
-            with open(pass_baseline_reqs_path, 'r') as f:
-                lines = [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
-            
+            lines = _read_req_lines(pass_baseline_reqs_path)
+
+            # Parse the baseline once per pass; probes only need the lines and version map.
+            self._probe_cache.clear()
+            baseline_lines = lines
+            baseline_versions = {}
+            for line in lines:
+                if '==' in line:
+                    parts = line.split(';')[0].split('==')
+                    if len(parts) == 2:
+                        baseline_versions[self._get_package_name_from_spec(parts[0].strip())] = parts[1].strip()
+
+            pinned_packages = []
             for line in lines:
                 if '==' not in line: continue
                 package_part = line.split(';')[0].strip()
-                
+
                 # 2. Now, we are left with a clean 'package==version' string, which is safe to split.
                 parts = package_part.split('==')
                 if len(parts) != 2: continue # Safety check for malformed lines like '-e .'
@@ -156,8 +275,17 @@ class DependencyAgent:
                 package = self._get_package_name_from_spec(parts[0].strip())
                 current_version = parts[1].strip()
                 # --- END OF YOUR FIX ---
+                pinned_packages.append((package, current_version))
+
+            # Each lookup is a blocking PyPI round-trip; fan them out.
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                latest_versions = dict(zip(
+                    (pkg for pkg, _ in pinned_packages),
+                    executor.map(self.get_latest_version, (pkg for pkg, _ in pinned_packages))
+                ))
 
-                latest_version = self.get_latest_version(package)
+            for package, current_version in pinned_packages:
+                latest_version = latest_versions.get(package)
                 if latest_version and parse_version(latest_version) > parse_version(current_version):
                     packages_to_update.append((package, current_version, latest_version))
             if not packages_to_update:
@@ -172,11 +300,13 @@ class DependencyAgent:
                 if pass_baseline_reqs_path.exists(): pass_baseline_reqs_path.unlink()
                 break
 
-            packages_to_update.sort(key=lambda p: self._calculate_update_risk(p[0], p[1], p[2]), reverse=True)
+            # Compute each risk score once; it is needed by both the sort and the plan printout.
+            risk_scores = {entry: self._calculate_update_risk(*entry) for entry in packages_to_update}
+            packages_to_update.sort(key=risk_scores.get, reverse=True)
             print("\nPrioritized Update Plan for this Pass:")
             total_updates_in_plan = len(packages_to_update)
             for i, (pkg, cur_ver, target_ver) in enumerate(packages_to_update):
-                score = self._calculate_update_risk(pkg, cur_ver, target_ver)
+                score = risk_scores[(pkg, cur_ver, target_ver)]
                 print(f"  {i+1}/{total_updates_in_plan}: {pkg} (Risk: {score:.2f}) -> {target_ver}")
             
             changed_packages_this_pass = set()
@@ -186,7 +316,7 @@ class DependencyAgent:
                 print(f"\n" + "-"*80); print(f"PULSE: [PASS {pass_num} | ATTEMPT {i+1}/{total_updates_in_plan}] Processing '{package}'"); print(f"PULSE: Changed packages this pass so far: {changed_packages_this_pass}"); print("-"*80)
                 
                 success, reason, _ = self.attempt_update_with_healing(
-                    package, current_ver, target_ver, dynamic_constraints, pass_baseline_reqs_path, changed_packages_this_pass
+                    package, current_ver, target_ver, dynamic_constraints, baseline_lines, baseline_versions, changed_packages_this_pass
                 )
                 
                 if success:
@@ -215,12 +345,16 @@ class DependencyAgent:
 
     def _apply_pass_updates(self, successful_updates, baseline_reqs_path):
         print("\nApplying successful changes from this pass...")
-        with open(baseline_reqs_path, "r") as f_read:
-            lines = [line.strip() for line in f_read if line.strip()]
+        lines = _read_req_lines(baseline_reqs_path)
 
+        # Index the lines once and patch in place rather than rebuilding the
+        # whole list per updated package.
+        line_index = {self._get_package_name_from_spec(l): i for i, l in enumerate(lines)}
         for package, new_version in successful_updates.items():
-             lines = [f"{package}=={new_version}" if self._get_package_name_from_spec(l) == package else l for l in lines]
-        
+            i = line_index.get(package)
+            if i is not None:
+                lines[i] = f"{package}=={new_version}"
+
         venv_dir = Path("./temp_venv")
         if venv_dir.exists(): shutil.rmtree(venv_dir)
         venv.create(venv_dir, with_pip=True)
@@ -230,7 +364,7 @@ class DependencyAgent:
         with open(temp_reqs_path, "w") as f_write:
             f_write.write("\n".join(lines))
         
-        _, stderr, returncode = run_command([python_executable, "-m", "pip", "install", "-r", str(temp_reqs_path)])
+        _, stderr, returncode = run_command([python_executable, "-m", "pip", "install", "--prefer-binary", "-r", str(temp_reqs_path)])
         if returncode != 0:
             print(f"CRITICAL: Failed to install combined updates at end of pass. Reverting. Error: {stderr}", file=sys.stderr)
             shutil.copy(baseline_reqs_path, self.requirements_path)
@@ -273,7 +407,7 @@ class DependencyAgent:
         venv.create(venv_dir, with_pip=True)
         python_executable = str((venv_dir / "bin" / "python").resolve())
 
-        _, stderr, returncode = run_command([python_executable, "-m", "pip", "install", "-r", str(self.requirements_path)])
+        _, stderr, returncode = run_command([python_executable, "-m", "pip", "install", "--prefer-binary", "-r", str(self.requirements_path)])
         if returncode != 0:
             print(f"CRITICAL ERROR: Final installation of combined dependencies failed! Error:\n{stderr}", file=sys.stderr)
             return
@@ -287,9 +421,15 @@ class DependencyAgent:
         else:
             print("\n" + "!"*70); print("!!! CRITICAL ERROR: Final validation failed! !!!"); print("!"*70)
 
+    def _get_project_page(self, package_name):
+        """Fetches (and memoizes per run) the PyPI project page for a package."""
+        if package_name not in self._page_cache:
+            self._page_cache[package_name] = self.pypi.get_project_page(package_name)
+        return self._page_cache[package_name]
+
     def get_latest_version(self, package_name):
         try:
-            page = self.pypi.get_project_page(package_name)
+            page = self._get_project_page(package_name)
             if not (page and page.packages): return None
             stable_versions = [p.version for p in page.packages if p.version and not parse_version(p.version).is_prerelease]
             if stable_versions:
@@ -298,24 +438,62 @@ class DependencyAgent:
             return max(all_versions, key=parse_version) if all_versions else None
         except Exception: return None
 
-    def _try_install_and_validate(self, package_to_update, new_version, dynamic_constraints, baseline_reqs_path, is_probe, changed_packages):
-        venv_dir = Path("./temp_venv")
-        if venv_dir.exists(): shutil.rmtree(venv_dir)
-        venv.create(venv_dir, with_pip=True)
+    def _try_install_and_validate(self, package_to_update, new_version, dynamic_constraints, baseline_lines, baseline_versions, is_probe, changed_packages):
+        # No-op probes are free: bail before any venv or pip work, and reuse
+        # results for (package, version) pairs already probed this pass.
+        if new_version == baseline_versions.get(package_to_update) and not changed_packages:
+            return True, "Validation skipped (no change)", ""
+        probe_key = (package_to_update, new_version, frozenset(changed_packages))
+        if probe_key in self._probe_cache:
+            return self._probe_cache[probe_key]
+
+        # Creating a venv with pip is the slowest step of a probe; build it once
+        # per run and let the pinned installs below converge it to each candidate set.
+        venv_dir = Path("./probe_venv")
+        if not venv_dir.exists():
+            venv.create(venv_dir, with_pip=True)
         python_executable = str((venv_dir / "bin" / "python").resolve())
-        
+
         temp_reqs_path = venv_dir / "temp_requirements.txt"
-        with open(baseline_reqs_path, "r") as f_read, open(temp_reqs_path, "w") as f_write:
-            lines = [f"{package_to_update}=={new_version}" if self._get_package_name_from_spec(l) == package_to_update else l.strip() for l in f_read if l.strip() and not l.strip().startswith('#')]
+        lines = list(baseline_lines)
+        for i, l in enumerate(lines):
+            if self._get_package_name_from_spec(l) == package_to_update:
+                lines[i] = f"{package_to_update}=={new_version}"
+                break
+        with open(temp_reqs_path, "w") as f_write:
             f_write.write("\n".join(lines))
 
-        _, stderr_install, returncode = run_command([python_executable, "-m", "pip", "install", "-r", str(temp_reqs_path)])
-        
+        # First probe against a given baseline syncs the whole venv; later probes
+        # install only the package under test (restoring any package a previous
+        # probe moved off-baseline), with every other pin supplied as a
+        # constraint so the resolver has nothing to backtrack over.
+        if self._probe_baseline != baseline_lines:
+            _, stderr_install, returncode = run_command([python_executable, "-m", "pip", "install", "--prefer-binary", "-r", str(temp_reqs_path)])
+            if returncode == 0:
+                self._probe_baseline = list(baseline_lines)
+                self._probe_overrides = {package_to_update: new_version}
+        else:
+            constraints_path = venv_dir / "constraints.txt"
+            with open(constraints_path, "w") as f_write:
+                f_write.write("\n".join(
+                    l for l in baseline_lines
+                    if '==' in l and not l.startswith('-e') and self._get_package_name_from_spec(l) != package_to_update
+                ))
+            specs = [f"{package_to_update}=={new_version}"]
+            for stale_pkg in self._probe_overrides:
+                if stale_pkg != package_to_update and stale_pkg in baseline_versions:
+                    specs.append(f"{stale_pkg}=={baseline_versions[stale_pkg]}")
+            _, stderr_install, returncode = run_command(
+                [python_executable, "-m", "pip", "install", "--prefer-binary", "-c", str(constraints_path)] + specs)
+            if returncode == 0:
+                self._probe_overrides = {package_to_update: new_version}
+            else:
+                # A failed partial install may leave the venv off-baseline; force a full resync.
+                self._probe_baseline = None
+
         if returncode != 0:
-            print("INFO: Main installation failed. Retrying with verbose logging to identify conflicting packages...")
-            _, stderr_for_logs, _ = run_command([python_executable, "-m", "pip", "install"] + temp_reqs_path.read_text().splitlines())
-            
-            conflict_match = re.search(r"Cannot install(?P<packages>[\s\S]+?)because", stderr_for_logs)
+            print("INFO: Main installation failed. Inspecting captured log to identify conflicting packages...")
+            conflict_match = _CONFLICT_RE.search(stderr_install)
             reason = ""
             if conflict_match:
                 conflicting_packages = ' '.join(conflict_match.group('packages').split()).replace(' and ', ', ').replace(',', ', ')
@@ -325,29 +503,25 @@ class DependencyAgent:
                 llm_summary = self._ask_llm_to_summarize_error(stderr_install)
                 reason = f"Installation conflict. Summary: {llm_summary}"
             
-            return False, reason, stderr_install
-
-        old_version = "N/A"
-        with open(baseline_reqs_path, 'r') as f:
-             for line in f:
-                 if self._get_package_name_from_spec(line) == package_to_update:
-                     if '==' in line: old_version = line.split('==')[1]
-
-        if new_version == old_version and not changed_packages:
-             return True, "Validation skipped (no change)", ""
+            result = (False, reason, stderr_install)
+            self._probe_cache[probe_key] = result
+            return result
 
         group_title = f"Validation for {package_to_update}=={new_version}"
         val_success, metrics, val_output = validate_changes(python_executable, self.config, group_title=group_title)
 
         if not val_success:
-            return False, "Validation script failed", val_output
-        return True, metrics, ""
+            result = (False, "Validation script failed", val_output)
+        else:
+            result = (True, metrics, "")
+        self._probe_cache[probe_key] = result
+        return result
 
-    def attempt_update_with_healing(self, package, current_version, target_version, dynamic_constraints, baseline_reqs_path, changed_packages_this_pass):
+    def attempt_update_with_healing(self, package, current_version, target_version, dynamic_constraints, baseline_lines, baseline_versions, changed_packages_this_pass):
         package_label = "(Primary)" if package in self.primary_packages else "(Transient)"
-        
+
         success, result_data, stderr = self._try_install_and_validate(
-            package, target_version, dynamic_constraints, baseline_reqs_path, 
+            package, target_version, dynamic_constraints, baseline_lines, baseline_versions,
             is_probe=False, changed_packages=changed_packages_this_pass
         )
         
@@ -364,7 +538,7 @@ class DependencyAgent:
                 if parse_version(candidate) <= parse_version(current_version): continue
                 print(f"INFO: Attempting LLM-suggested backtrack for {package} to {candidate}")
                 success, result_data, _ = self._try_install_and_validate(
-                    package, candidate, dynamic_constraints, baseline_reqs_path,
+                    package, candidate, dynamic_constraints, baseline_lines, baseline_versions,
                     is_probe=False, changed_packages=changed_packages_this_pass
                 )
                 if success:
@@ -372,38 +546,45 @@ class DependencyAgent:
 
         print(f"INFO: LLM suggestions failed. Falling back to Binary Search backtracking.")
         found_version = self._binary_search_backtrack(
-            package, current_version, target_version, dynamic_constraints, 
-            baseline_reqs_path, changed_packages_this_pass
+            package, current_version, target_version, dynamic_constraints,
+            baseline_lines, baseline_versions, changed_packages_this_pass
         )
         if found_version:
             return True, found_version, None
         return False, "All backtracking attempts failed.", None
     
-    def _binary_search_backtrack(self, package, last_good_version, failed_version, dynamic_constraints, baseline_reqs_path, changed_packages):
+    def _binary_search_backtrack(self, package, last_good_version, failed_version, dynamic_constraints, baseline_lines, baseline_versions, changed_packages):
         start_group(f"Binary Search Backtrack for {package}")
         
         versions = self.get_all_versions_between(package, last_good_version, failed_version)
         if last_good_version not in versions:
             versions.insert(0, last_good_version)
         
+        # True bisection: versions is sorted ascending, and we assume working
+        # versions form a prefix. O(log N) probes instead of O(N), and each
+        # probe costs a venv install.
         best_working_version = None
-        for test_version in reversed(versions):
+        lo, hi = 0, len(versions) - 1
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            test_version = versions[mid]
             print(f"Binary Search: Probing version {test_version}...")
-            
+
             success, reason_or_metrics, _ = self._try_install_and_validate(
-                package, test_version, dynamic_constraints, 
-                baseline_reqs_path, is_probe=True, changed_packages=changed_packages
+                package, test_version, dynamic_constraints,
+                baseline_lines, baseline_versions, is_probe=True, changed_packages=changed_packages
             )
-            
+
             if success:
                 if "skipped" in str(reason_or_metrics):
                     print(f"  --> {reason_or_metrics}")
                 print(f"Binary Search: Version {test_version} PASSED probe.")
                 best_working_version = test_version
-                break 
+                lo = mid + 1
             else:
                 print(f"Binary Search: Version {test_version} FAILED probe. Reason: {reason_or_metrics}")
-        
+                hi = mid - 1
+
         end_group()
         if best_working_version:
             print(f"Binary Search SUCCESS: Found latest stable version: {best_working_version}")
@@ -414,26 +595,25 @@ class DependencyAgent:
     
     def get_all_versions_between(self, package_name, start_ver_str, end_ver_str):
         try:
-            page = self.pypi.get_project_page(package_name)
+            page = self._get_project_page(package_name)
             if not (page and page.packages): return []
             start_v, end_v = parse_version(start_ver_str), parse_version(end_ver_str)
-            candidate_versions = {parse_version(p.version) for p in page.packages if p.version and start_v <= parse_version(p.version) < end_v and not getattr(parse_version(p.version), 'is_prerelease', False)}
-            return sorted([str(v) for v in candidate_versions], key=parse_version)
+            # Parse each release string exactly once; packaging Version always has is_prerelease.
+            parsed = {parse_version(p.version) for p in page.packages if p.version}
+            candidate_versions = {pv for pv in parsed if start_v <= pv < end_v and not pv.is_prerelease}
+            return [str(v) for v in sorted(candidate_versions)]
         except Exception: return []
 
     def _prune_pip_freeze(self, freeze_output):
-        lines = freeze_output.strip().split('\n')
-        pruned_lines = [
-            line for line in lines 
+        return "\n".join(
+            line for line in freeze_output.strip().splitlines()
             if ('==' in line and not line.startswith('-e')) or line.startswith('-e')
-        ]
-        return "\n".join(pruned_lines)
+        )
     
     def _ask_llm_for_root_cause(self, package, error_message):
         if not self.llm_available: return {}
         py_version = f"{sys.version_info.major}.{sys.version_info.minor}"
-        with open(self.config["REQUIREMENTS_FILE"], "r") as f:
-            current_requirements = f.read()
+        current_requirements = Path(self.config["REQUIREMENTS_FILE"]).read_text()
         prompt = f"""You are an expert Python dependency diagnostician AI. Analyze the error that occurred when updating '{package}' in a project with these requirements:
 ---
 {current_requirements}
@@ -445,7 +625,7 @@ The error on Python {py_version} was:
 Respond in JSON. Is the root_cause 'self' or 'incompatibility'? If incompatibility, name the 'package' and 'suggested_constraint'. Example: {{"root_cause": "incompatibility", "package": "numpy", "suggested_constraint": "<2.0"}}"""
         try:
             response = self.llm.generate_content(prompt)
-            json_text = re.search(r'\{.*\}', response.text, re.DOTALL).group(0)
+            json_text = _JSON_RE.search(response.text).group(0)
             return json.loads(json_text)
         except Exception: return {}
 
@@ -454,7 +634,7 @@ Respond in JSON. Is the root_cause 'self' or 'incompatibility'? If incompatibili
         prompt = f"Give a Python list of the {self.config['MAX_LLM_BACKTRACK_ATTEMPTS']} most recent, previous release versions of the python package '{package}', starting from the version just before '{failed_version}'. The list must be in descending order. Respond ONLY with the list."
         try:
             response = self.llm.generate_content(prompt)
-            match = re.search(r'(\[.*?\])', response.text, re.DOTALL)
+            match = _LIST_RE.search(response.text)
             if not match: return []
             return ast.literal_eval(match.group(1))
         except ResourceExhausted:
@@ -463,8 +643,14 @@ Respond in JSON. Is the root_cause 'self' or 'incompatibility'? If incompatibili
 
     def _ask_llm_to_summarize_error(self, error_message):
         if not self.llm_available: return "(LLM unavailable due to quota)"
+        # Identical stderrs recur across probes; skip the LLM round-trip for repeats.
+        err_hash = hashlib.sha1(error_message.encode()).hexdigest()
+        if err_hash in self._summary_cache:
+            return self._summary_cache[err_hash]
         prompt = f"The following is a Python pip install error log. Please summarize the root cause of the conflict in a single, concise sentence. Error Log: --- {error_message} ---"
         try:
-            response = self.llm.generate_content(prompt)
-            return response.text.strip().replace('\n', ' ')
-        except Exception: return "Failed to get summary from LLM."
\ No newline at end of file
+            summary = self.llm.generate_content(prompt).text.strip().replace('\n', ' ')
+        except Exception:
+            return "Failed to get summary from LLM."
+        self._summary_cache[err_hash] = summary
+        return summary
\ No newline at end of file
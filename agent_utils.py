@@ -1,10 +1,18 @@
 # agent_utils.py
 
+import hashlib
+import json
+import os
 import subprocess
 import re
 import sys
+import threading
+from collections import deque
 from pathlib import Path
 
+_PYTEST_SUMMARY_RE = re.compile(r"(\d+)\s+(passed|failed|skipped|xfailed|xpassed|errors)")
+_SMOKE_METRIC_RE = re.compile(r"Smoke Test: (.+)")
+
 def start_group(title):
     """Starts a collapsible log group in GitHub Actions."""
     print(f"\n::group::{title}")
@@ -13,12 +21,41 @@ def end_group():
     """Ends a collapsible log group in GitHub Actions."""
     print("::endgroup::")
 
-def run_command(command, cwd=None):
+def _drain_stream(stream, chunks):
+    """Reads a subprocess pipe in 64KB chunks until EOF."""
+    while True:
+        chunk = stream.read(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    stream.close()
+
+def run_command(command, cwd=None, extra_env=None):
     """Runs a command and returns the output, error, and return code."""
     display_command = ' '.join(command)
     print(f"--> Running command: '{display_command}' in CWD: '{cwd or '.'}'")
-    result = subprocess.run(command, capture_output=True, text=True, cwd=cwd)
-    return result.stdout, result.stderr, result.returncode
+    env = os.environ.copy()
+    # Share one wheel cache across every pip invocation (probes included).
+    env.setdefault("PIP_CACHE_DIR", str(Path("./.pip_cache").resolve()))
+    if extra_env:
+        env.update(extra_env)
+    # Drain both pipes while the process runs instead of letting subprocess.run
+    # buffer and decode the whole log at once; the deques bound peak memory by
+    # keeping only the most recent ~256MB of each stream.
+    proc = subprocess.Popen(command, cwd=cwd, env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            bufsize=1024 * 1024)
+    stdout_chunks, stderr_chunks = deque(maxlen=4096), deque(maxlen=4096)
+    readers = [
+        threading.Thread(target=_drain_stream, args=(proc.stdout, stdout_chunks), daemon=True),
+        threading.Thread(target=_drain_stream, args=(proc.stderr, stderr_chunks), daemon=True),
+    ]
+    for reader in readers: reader.start()
+    returncode = proc.wait()
+    for reader in readers: reader.join()
+    stdout = b"".join(stdout_chunks).decode("utf-8", "replace")
+    stderr = b"".join(stderr_chunks).decode("utf-8", "replace")
+    return stdout, stderr, returncode
 
 def _parse_pytest_summary(full_output):
     """A helper function to parse the rich summary line from a pytest run."""
@@ -26,23 +63,32 @@ def _parse_pytest_summary(full_output):
         "passed": "0", "failed": "0", "errors": "0",
         "skipped": "0", "xfailed": "0", "xpassed": "0"
     }
+    # Scan backward from the end of the log with rfind instead of splitting the
+    # whole (potentially multi-MB) output into a list; the summary line is
+    # always within the last few lines. Match on the count pattern itself
+    # rather than the '=' bars, which -q mode omits ("1 failed, 1 passed in 0.02s").
     summary_line = ""
-    for line in reversed(full_output.splitlines()):
-        if "=" in line and ("passed" in line or "failed" in line or "skipped" in line):
+    end = len(full_output)
+    for _ in range(40):
+        start = full_output.rfind('\n', 0, end - 1) + 1
+        line = full_output[start:end].rstrip('\n')
+        if _PYTEST_SUMMARY_RE.search(line):
             summary_line = line
             break
+        end = start - 1
+        if end <= 0:
+            break
     if not summary_line:
         return summary
-    matches = re.findall(r"(\d+)\s+(passed|failed|skipped|xfailed|xpassed|errors)", summary_line)
+    matches = _PYTEST_SUMMARY_RE.findall(summary_line)
     for count, status in matches:
         if status in summary:
             summary[status] = count
     return summary
 
-def _run_smoke_test(python_executable, config):
+def _run_smoke_test(python_executable, validation_config):
     """Runs a simple, binary smoke test script from the project root."""
     print("\n--- Running Smoke Test ---")
-    validation_config = config.get("VALIDATION_CONFIG", {})
     script_path = validation_config.get("smoke_test_script")
 
     if not script_path:
@@ -59,23 +105,50 @@ def _run_smoke_test(python_executable, config):
     print("Smoke test PASSED.")
     
     # Let's try to find a success metric in the output for better reporting.
-    match = re.search(r"Smoke Test: (.+)", stdout)
+    match = _SMOKE_METRIC_RE.search(stdout)
     metrics = match.group(1) if match else "Smoke test passed."
 
     return True, metrics, stdout + stderr
 
-def _run_pytest_suite(python_executable, config):
+_XDIST_AVAILABLE = {}
+_PYTEST_RUN_COUNT = 0
+
+def _has_xdist(python_executable):
+    """Checks (once per interpreter) whether pytest-xdist is installed there."""
+    if python_executable not in _XDIST_AVAILABLE:
+        result = subprocess.run([python_executable, "-c", "import xdist"], capture_output=True)
+        _XDIST_AVAILABLE[python_executable] = result.returncode == 0
+    return _XDIST_AVAILABLE[python_executable]
+
+def _run_pytest_suite(python_executable, validation_config, threshold):
     """Runs a full pytest suite and provides a detailed result."""
     print("\n--- Running Full Pytest Suite ---")
-    validation_config = config.get("VALIDATION_CONFIG", {})
     target = validation_config.get("pytest_target")
     project_dir = validation_config.get("project_dir") # Project dir for cwd
 
     if not target:
         return False, "Pytest failed: 'pytest_target' not defined in config.", ""
-    
-    command = [python_executable, "-m", "pytest", target]
-    stdout, stderr, returncode = run_command(command, cwd=project_dir)
+
+    # Quiet, header-less, cache-less output keeps the captured log (and the
+    # summary parse) small; with a zero failure budget there is no point
+    # running past the first failure.
+    global _PYTEST_RUN_COUNT
+    _PYTEST_RUN_COUNT += 1
+    command = [python_executable, "-m", "pytest", "-q", "--no-header"]
+    if _PYTEST_RUN_COUNT == 1:
+        command += ["-p", "no:cacheprovider"]
+    else:
+        # Later agent passes keep .pytest_cache so previously failing tests
+        # run first and a still-broken suite bails out quickly.
+        command.append("--ff")
+    if threshold == 0:
+        command.append("--maxfail=1")
+    elif _has_xdist(python_executable):
+        # No early exit possible, so spread the suite across cores instead;
+        # loadfile keeps each test file (and its imports) on one worker.
+        command += ["-n", "auto", "--dist=loadfile"]
+    command.append(target)
+    stdout, stderr, returncode = run_command(command, cwd=project_dir, extra_env={"PYTHONDONTWRITEBYTECODE": "1"})
     full_output = stdout + stderr
 
     if returncode > 1: # Critical error (e.g., collection failure)
@@ -84,8 +157,13 @@ def _run_pytest_suite(python_executable, config):
         
     summary = _parse_pytest_summary(full_output)
     total_failures = int(summary["failed"]) + int(summary["errors"])
-    threshold = config.get("ACCEPTABLE_FAILURE_THRESHOLD", 0)
-    
+
+    # Exit code 1 means pytest saw failures; never let an unparseable summary
+    # turn that into a pass.
+    if returncode == 1 and total_failures == 0:
+        print("VALIDATION FAILED: Pytest exited with failures but none could be parsed from the log.", file=sys.stderr)
+        return False, "Pytest reported failures (summary not parseable)", full_output
+
     if total_failures > threshold:
         reason = f"{total_failures} real failures/errors, which exceeds the threshold of {threshold}."
         print(f"VALIDATION FAILED: {reason}", file=sys.stderr)
@@ -114,35 +192,66 @@ def validate_changes(python_executable, config, group_title="Running Validation"
     """
     start_group(group_title)
     
+    # Bind the sub-config and threshold once; the helpers take them directly.
     validation_config = config.get("VALIDATION_CONFIG", {})
     validation_type = validation_config.get("type", "pytest")
-    
+    threshold = config.get("ACCEPTABLE_FAILURE_THRESHOLD", 0)
+
     success = False
     reason = "No validation configured."
     full_output = ""
 
     if validation_type == "script":
-        success, reason, full_output = _run_smoke_test(python_executable, config)
+        success, reason, full_output = _run_smoke_test(python_executable, validation_config)
 
     elif validation_type == "pytest":
-        success, reason, full_output = _run_pytest_suite(python_executable, config)
-    
+        success, reason, full_output = _run_pytest_suite(python_executable, validation_config, threshold)
+
     elif validation_type == "smoke_test_with_pytest_report":
-        smoke_success, smoke_reason, smoke_output = _run_smoke_test(python_executable, config)
-        full_output += smoke_output
-        
+        smoke_success, smoke_reason, smoke_output = _run_smoke_test(python_executable, validation_config)
+        # Collect the (potentially multi-MB) log pieces and join once at the
+        # end instead of repeated string concatenation.
+        output_parts = [smoke_output]
+        full_output = smoke_output
+
         if not smoke_success:
             end_group()
             return False, smoke_reason, full_output
 
+        # The pytest result only feeds the metrics in `reason`; for an agent run
+        # probing many candidates against the same installed set, reuse the
+        # report instead of re-running a multi-minute suite. The key must
+        # reflect what is actually installed in the venv under validation (a
+        # probe venv holds a different candidate each time the repo's
+        # requirements file stays unchanged), so hash `pip freeze` from that
+        # interpreter rather than the requirements file on disk.
+        cache_path = None
+        freeze_out, _, freeze_rc = run_command([python_executable, "-m", "pip", "freeze"])
+        if freeze_rc == 0:
+            env_sha = hashlib.sha256(freeze_out.encode()).hexdigest()
+            cache_path = Path(f".agent_cache/pytest_{env_sha}.json")
+        if cache_path and cache_path.exists():
+            try:
+                cached = json.loads(cache_path.read_text())
+                print("\n--- Smoke test passed. Reusing cached pytest report for identical installed set. ---")
+                end_group()
+                return True, f"{smoke_reason}\n\n{cached['metrics']}", full_output
+            except Exception:
+                pass
+
         print("\n--- Smoke test passed. Running pytest suite for detailed reporting. ---")
-        pytest_success, pytest_metrics, pytest_output = _run_pytest_suite(python_executable, config)
-        full_output += "\n\n" + pytest_output
-        
+        pytest_success, pytest_metrics, pytest_output = _run_pytest_suite(python_executable, validation_config, threshold)
+        output_parts.extend(("\n\n", pytest_output))
+        full_output = "".join(output_parts)
+
         # The overall success is determined by the pytest run, but only if the smoke test passed.
         success = pytest_success
         reason = f"{smoke_reason}\n\n{pytest_metrics}"
 
+        if success and cache_path:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            cache_path.write_text(json.dumps({"metrics": pytest_metrics}))
+
     else:
         print(f"WARNING: Unknown validation type '{validation_type}'. Assuming success.", file=sys.stderr)
         success = True
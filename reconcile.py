@@ -1,13 +1,21 @@
 # reconcile.py (The Final, Correct, and Clean Version)
 
+import os
 from pathlib import Path
 import re
 import sys
 
+_PKG_RE = re.compile(r'^(?:-e\s+)?([a-zA-Z0-9\-_]+)')
+_CANON_RE = re.compile(r"[-_.]+")
+
+def canonicalize(name: str) -> str:
+    """PEP 503 name normalization, matching pip's own comparison rules."""
+    return _CANON_RE.sub("-", name).lower() if name else name
+
 def get_package_name_from_line(line: str) -> str | None:
-    """Robustly extracts the package name from a requirements line."""
-    match = re.match(r'^(-e\s+)?([a-zA-Z0-9\-_]+)', line.strip())
-    return match.group(2) if match else None
+    """Robustly extracts the (canonicalized) package name from a requirements line."""
+    match = _PKG_RE.match(line.strip())
+    return canonicalize(match.group(1)) if match else None
 
 def clean_line_for_golden_record(line: str) -> str:
     """
@@ -33,8 +41,9 @@ def reconcile_requirements():
     if not ideal_state_path.exists():
         sys.exit("ERROR: Ideal state file (temp-ideal-state.txt) not found.")
 
-    with open(ideal_state_path, "r") as f:
-        ideal_deps_lines = [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+    # One read + C-level splitlines instead of Python-level per-line iteration.
+    ideal_text = ideal_state_path.read_text()
+    ideal_deps_lines = [l for l in map(str.strip, ideal_text.splitlines()) if l and not l.startswith('#')]
     
     # --- THIS IS THE FINAL, UNIFIED LOGIC ---
     
@@ -51,14 +60,16 @@ def reconcile_requirements():
         return
 
     # For subsequent runs, we also use the cleaning logic.
-    with open(golden_record_path, "r") as f:
-        golden_package_names = {get_package_name_from_line(line) for line in f if line.strip()}
-    
+    golden_text = golden_record_path.read_text()
+    golden_package_names = {name for name in (get_package_name_from_line(line) for line in golden_text.splitlines() if line.strip()) if name}
+
+    # Names are already canonicalized at ingest, so membership is a plain
+    # O(1) set lookup — `Flask_Compress` and `flask-compress` compare equal.
     new_deps_to_add = []
     for ideal_line in ideal_deps_lines:
         ideal_pkg_name = get_package_name_from_line(ideal_line)
-        
-        if ideal_pkg_name and ideal_pkg_name.lower() not in (name.lower() for name in golden_package_names):
+
+        if ideal_pkg_name and ideal_pkg_name not in golden_package_names:
             # YOUR LOGIC: Clean the line BEFORE appending it.
             cleaned_line = clean_line_for_golden_record(ideal_line)
             print(f"New dependency '{ideal_pkg_name}' discovered. Adding cleaned version to Golden Record: '{cleaned_line}'")
@@ -66,8 +77,16 @@ def reconcile_requirements():
 
     if new_deps_to_add:
         print(f"Adding {len(new_deps_to_add)} new, clean dependencies to Golden Record.")
-        with open(golden_record_path, "a") as f:
-            f.write("\n" + "\n".join(sorted(new_deps_to_add)))
+        # Single appending write, and only prepend a newline when the file
+        # doesn't already end with one (blind '\n' + join could leave a stray
+        # blank line).
+        payload = (b'' if golden_text.endswith('\n') else b'\n') \
+            + '\n'.join(sorted(new_deps_to_add)).encode() + b'\n'
+        fd = os.open(str(golden_record_path), os.O_WRONLY | os.O_APPEND)
+        try:
+            os.write(fd, payload)
+        finally:
+            os.close(fd)
     else:
         print("Golden Record is in sync with pyproject.toml. No new dependencies found.")
 